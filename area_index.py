@@ -0,0 +1,352 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+# areas.json をメモリマップ可能なバイナリ形式に変換したもの。
+# 各プロセスは読み取り専用で mmap するだけで、JSON の解析は不要。
+# 物理ページは OS のページキャッシュを通じてプロセス間で共有される。
+#
+# レイアウト (リトルエンディアン):
+#   ヘッダー      : マジック, 形式バージョン, 元 JSON のサイズと mtime, セクション数, 子コード表の位置と件数, 文字列ブロブの位置と長さ
+#   セクション表  : セクション名, 件数, コード配列/ソート済み索引/レコード表の位置
+#   コード配列    : 固定長 8 バイトのコード (JSON の出現順)
+#   ソート済み索引: コード順に並べたレコード番号 (二分探索用)
+#   レコード表    : 名前・英名の (位置, 長さ), 親コード, 子コードの (開始, 件数)
+#   子コード表    : 固定長 8 バイトのコード
+#   文字列ブロブ  : 重複を除いた UTF-8 文字列
+
+MAGIC = b"JMAAREA1"
+FORMAT_VERSION = 2
+CODE_WIDTH = 8
+INDEX_FILE_MODE = 0o644
+MAX_STRING_BYTES = 0xFFFF
+SECTION_NAME_WIDTH = 16
+
+HEADER = struct.Struct("<8sIQqIIIII")
+SECTION = struct.Struct("<16sIIII")
+RECORD = struct.Struct("<IHIH8sII")
+INDEX_ENTRY = struct.Struct("<I")
+
+
+def _pack_code(code):
+    if len(code) > CODE_WIDTH:
+        raise ValueError(f"コードが長すぎます ({CODE_WIDTH} 文字まで): {code}")
+    return code.encode("ascii").ljust(CODE_WIDTH, b"\0")
+
+
+def _unpack_code(raw):
+    return raw.rstrip(b"\0").decode("ascii")
+
+
+def _source_stat(json_file_path):
+    st = os.stat(json_file_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def build_area_index(json_file_path, index_file_path):
+    source_size, source_mtime = _source_stat(json_file_path)
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        json_data = json.load(f)
+
+    blob = bytearray()
+    string_offsets = {}
+
+    def add_string(value):
+        data = (value or "").encode("utf-8")
+        if len(data) > MAX_STRING_BYTES:
+            raise ValueError(f"文字列が長すぎます ({MAX_STRING_BYTES} バイトまで): {value[:20]}...")
+        if data not in string_offsets:
+            string_offsets[data] = len(blob)
+            blob.extend(data)
+        return string_offsets[data], len(data)
+
+    sections = []
+    children = []
+    for section_name, entries in json_data.items():
+        if len(section_name.encode("ascii")) > SECTION_NAME_WIDTH:
+            raise ValueError(f"セクション名が長すぎます ({SECTION_NAME_WIDTH} バイトまで): {section_name}")
+        codes = list(entries.keys())
+        records = []
+        for code in codes:
+            entry = entries[code]
+            name_off, name_len = add_string(entry.get("name"))
+            en_off, en_len = add_string(entry.get("enName"))
+            entry_children = entry.get("children", [])
+            records.append((name_off, name_len, en_off, en_len,
+                            _pack_code(entry.get("parent", "")),
+                            len(children), len(entry_children)))
+            children.extend(_pack_code(child) for child in entry_children)
+        order = sorted(range(len(codes)), key=lambda i: codes[i])
+        sections.append((section_name, codes, order, records))
+
+    # 各テーブルの位置を決めてから書き出す
+    offset = HEADER.size + SECTION.size * len(sections)
+    section_table = []
+    for section_name, codes, order, records in sections:
+        codes_offset = offset
+        offset += CODE_WIDTH * len(codes)
+        index_offset = offset
+        offset += INDEX_ENTRY.size * len(codes)
+        records_offset = offset
+        offset += RECORD.size * len(records)
+        section_table.append(SECTION.pack(section_name.encode("ascii"), len(codes),
+                                          codes_offset, index_offset, records_offset))
+    children_offset = offset
+    offset += CODE_WIDTH * len(children)
+    blob_offset = offset
+    if blob_offset + len(blob) > 0xFFFFFFFF:
+        raise ValueError("エリアインデックスが大きすぎます")
+
+    out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, source_size, source_mtime, len(sections),
+                                children_offset, len(children), blob_offset, len(blob)))
+    for packed in section_table:
+        out.extend(packed)
+    for section_name, codes, order, records in sections:
+        for code in codes:
+            out.extend(_pack_code(code))
+        for i in order:
+            out.extend(INDEX_ENTRY.pack(i))
+        for record in records:
+            out.extend(RECORD.pack(*record))
+    for child in children:
+        out.extend(child)
+    out.extend(blob)
+
+    # 他のプロセスが書きかけのファイルを開かないよう、一時ファイルから置き換える。
+    # mkstemp は 0600 で作るので、別ユーザーのワーカーも読めるように広げておく
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(out)
+        os.chmod(tmp_path, INDEX_FILE_MODE)
+        os.replace(tmp_path, index_file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class AreaIndex:
+    # source_stat を渡すと、元 JSON のサイズ・mtime と一致しないインデックスを拒否する。
+    # 壊れている・古い形式・元 JSON と食い違う場合はすべて ValueError になる。
+    def __init__(self, index_file_path, source_stat=None):
+        with open(index_file_path, 'rb') as f:
+            # 空ファイルは mmap できず ValueError になる
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load_header(index_file_path, source_stat)
+        except (struct.error, UnicodeDecodeError, ValueError) as e:
+            self._buf.close()
+            raise ValueError(f"不正なエリアインデックスです: {index_file_path} ({e})") from e
+
+    def _load_header(self, index_file_path, source_stat):
+        (magic, version, source_size, source_mtime, section_count,
+         self._children_offset, children_count, self._blob_offset, blob_size) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("形式が一致しません")
+        if source_stat is not None and (source_size, source_mtime) != source_stat:
+            raise ValueError("元の JSON と一致しません")
+        if (self._children_offset + CODE_WIDTH * children_count != self._blob_offset
+                or self._blob_offset + blob_size != len(self._buf)):
+            raise ValueError("ファイルサイズがヘッダーと一致しません")
+
+        # セクション表だけは小さいので辞書に展開しておく
+        self._sections = {}
+        table_end = HEADER.size + SECTION.size * section_count
+        for i in range(section_count):
+            name, count, codes_offset, index_offset, records_offset = SECTION.unpack_from(
+                self._buf, HEADER.size + SECTION.size * i)
+            if not (table_end <= codes_offset
+                    and codes_offset + CODE_WIDTH * count <= index_offset
+                    and index_offset + INDEX_ENTRY.size * count <= records_offset
+                    and records_offset + RECORD.size * count <= self._children_offset):
+                raise ValueError("セクション表が範囲外を指しています")
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (count, codes_offset, index_offset, records_offset)
+
+    def close(self):
+        self._buf.close()
+
+    def _code_at(self, codes_offset, i):
+        start = codes_offset + CODE_WIDTH * i
+        return self._buf[start:start + CODE_WIDTH]
+
+    def _find(self, section, code):
+        if section not in self._sections or not isinstance(code, str):
+            return None
+        try:
+            key = _pack_code(code)
+        except ValueError:
+            return None
+        count, codes_offset, index_offset, _ = self._sections[section]
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (i,) = INDEX_ENTRY.unpack_from(self._buf, index_offset + INDEX_ENTRY.size * mid)
+            if self._code_at(codes_offset, i) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < count:
+            (i,) = INDEX_ENTRY.unpack_from(self._buf, index_offset + INDEX_ENTRY.size * lo)
+            if self._code_at(codes_offset, i) == key:
+                return i
+        return None
+
+    def _record(self, section, code):
+        i = self._find(section, code)
+        if i is None:
+            return None
+        records_offset = self._sections[section][3]
+        return RECORD.unpack_from(self._buf, records_offset + RECORD.size * i)
+
+    def _string(self, offset, length):
+        start = self._blob_offset + offset
+        return self._buf[start:start + length].decode("utf-8")
+
+    def codes(self, section):
+        if section not in self._sections:
+            return []
+        count, codes_offset, _, _ = self._sections[section]
+        return [_unpack_code(self._code_at(codes_offset, i)) for i in range(count)]
+
+    def __contains__(self, item):
+        section, code = item
+        return self._find(section, code) is not None
+
+    def name(self, section, code, default=None):
+        record = self._record(section, code)
+        if record is None or record[1] == 0:
+            return default
+        return self._string(record[0], record[1])
+
+    def en_name(self, section, code, default=None):
+        record = self._record(section, code)
+        if record is None or record[3] == 0:
+            return default
+        return self._string(record[2], record[3])
+
+    def parent(self, section, code):
+        record = self._record(section, code)
+        if record is None:
+            return None
+        return _unpack_code(record[4]) or None
+
+    def children(self, section, code):
+        record = self._record(section, code)
+        if record is None:
+            return []
+        start, count = record[5], record[6]
+        return [_unpack_code(self._code_at(self._children_offset, start + i)) for i in range(count)]
+
+
+# インデックスを書き出せない環境向けに、同じ読み出し API を JSON の辞書で提供する
+class JsonAreaIndex:
+    def __init__(self, json_file_path):
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            self._data = json.load(f)
+
+    def close(self):
+        pass
+
+    def _entry(self, section, code):
+        entry = self._data.get(section, {}).get(code) if isinstance(code, str) else None
+        return entry or {}
+
+    def codes(self, section):
+        return list(self._data.get(section, {}).keys())
+
+    def __contains__(self, item):
+        section, code = item
+        return isinstance(code, str) and code in self._data.get(section, {})
+
+    def name(self, section, code, default=None):
+        return self._entry(section, code).get("name") or default
+
+    def en_name(self, section, code, default=None):
+        return self._entry(section, code).get("enName") or default
+
+    def parent(self, section, code):
+        return self._entry(section, code).get("parent") or None
+
+    def children(self, section, code):
+        return list(self._entry(section, code).get("children", []))
+
+
+# インデックスの置き場所の候補。アプリ自身が管理するディレクトリに限り、
+# 共有の一時ディレクトリ (誰でも同名ファイルを置ける) は使わない。
+#   1. areas.json と同じディレクトリの areas.bin (書き込めるか、既に作成済みの場合)
+#   2. ユーザーごとのキャッシュディレクトリ (元 JSON のパスごとに別ファイル)
+def index_file_paths(json_file_path):
+    json_file_path = os.path.abspath(json_file_path)
+    paths = [os.path.splitext(json_file_path)[0] + ".bin"]
+
+    if os.name == "nt":
+        cache_root = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        cache_root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(json_file_path.encode("utf-8")).hexdigest()[:16]
+    paths.append(os.path.join(cache_root, "weather", f"areas-{digest}.bin"))
+    return paths
+
+
+def _build_and_open(json_file_path, index_file_path, source_stat):
+    index_dir = os.path.dirname(index_file_path)
+    os.makedirs(index_dir, exist_ok=True)
+    if not os.access(index_dir, os.W_OK):
+        raise PermissionError(f"書き込めません: {index_dir}")
+    build_area_index(json_file_path, index_file_path)
+    return AreaIndex(index_file_path, source_stat)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# 同じプロセス内のセッションは同じマップを共有する。
+# 有効なインデックスがなければ書き込める候補に一度だけ作り直し、
+# それでも使えなければ JSON を直接読む。
+def open_area_index(json_file_path):
+    json_file_path = os.path.abspath(json_file_path)
+    with _indexes_lock:
+        index = _indexes.get(json_file_path)
+        if index is not None:
+            return index
+
+        source_stat = _source_stat(json_file_path)
+        paths = index_file_paths(json_file_path)
+        for index_file_path in paths:
+            try:
+                index = AreaIndex(index_file_path, source_stat)
+                break
+            except (OSError, ValueError):
+                pass
+        else:
+            errors = []
+            for index_file_path in paths:
+                try:
+                    index = _build_and_open(json_file_path, index_file_path, source_stat)
+                    break
+                except (OSError, ValueError, struct.error) as e:
+                    errors.append(str(e))
+            else:
+                print(f"エリアインデックスを使用できないため JSON を直接読み込みます: {'; '.join(errors)}")
+                index = JsonAreaIndex(json_file_path)
+
+        _indexes[json_file_path] = index
+        return index
+
+
+if __name__ == "__main__":
+    json_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'areas.json')
+    source_stat = _source_stat(json_file_path)
+    for index_file_path in index_file_paths(json_file_path):
+        try:
+            _build_and_open(json_file_path, index_file_path, source_stat).close()
+        except (OSError, ValueError) as e:
+            print(f"エリアインデックスを作成できませんでした: {index_file_path} ({e})")
+            continue
+        print(f"エリアインデックスを作成しました: {index_file_path}")
+        break
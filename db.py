@@ -1,9 +1,11 @@
 import sqlite3
-import json
 import flet as ft
 import requests
 import os
 
+from area_index import open_area_index
+from forecast_fetch import fetch_forecast
+
 def setup_database():
     conn = sqlite3.connect('forecast_data.db')
     c = conn.cursor()
@@ -79,31 +81,28 @@ setup_database()
 def main(page: ft.Page):
     json_file_path = os.path.join(os.path.dirname(__file__), 'areas.json')
 
+    # 解析済みのエリアインデックスを mmap で開く (プロセス間でページを共有)
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        areas = open_area_index(json_file_path)
     except FileNotFoundError as e:
         print(f"JSONファイルが見つかりません: {e.filename}")
         return
-    except IOError as e:
-        print(f"JSONファイルの読み込みに失敗しました: {e.strerror}")
+    except (IOError, ValueError) as e:
+        print(f"エリアインデックスの読み込みに失敗しました: {e}")
         return
 
-    offices = json_data.get("offices", {})
-    centers = json_data.get("centers", {})
-
     def get_region_options():
-        return [ft.dropdown.Option(key, value.get("name", "Unknown")) for key, value in centers.items()]
+        return [ft.dropdown.Option(code, areas.name("centers", code, "Unknown")) for code in areas.codes("centers")]
 
     def on_region_select(e):
         selected_region_code = e.control.value
-        prefectures = centers.get(selected_region_code, {}).get("children", [])
+        prefectures = areas.children("centers", selected_region_code)
 
         if not prefectures:
             print(f"Error: No prefectures found for region code {selected_region_code}")
             return
 
-        prefecture_options = [ft.dropdown.Option(code, offices.get(code, {}).get("name", "Unnamed Area")) for code in prefectures]
+        prefecture_options = [ft.dropdown.Option(code, areas.name("offices", code, "Unnamed Area")) for code in prefectures]
 
         prefecture_dropdown.options = prefecture_options
         prefecture_dropdown.visible = True
@@ -113,15 +112,13 @@ def main(page: ft.Page):
 
     def on_prefecture_select(e):
         selected_prefecture_code = e.control.value
-        small_areas = offices.get(selected_prefecture_code, {}).get("children", [])
+        small_areas = areas.children("offices", selected_prefecture_code)
 
         if not small_areas:
             return
 
         pref_code = selected_prefecture_code
-        weather_response = requests.get(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{pref_code}.json")
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
+        weather_data = fetch_forecast(pref_code)
 
         area_name_map = {area["area"]["code"]: area["area"]["name"] for area in weather_data[0]["timeSeries"][0]["areas"]}
 
@@ -139,9 +136,7 @@ def main(page: ft.Page):
     def get_weather(area_code, area_name):
         try:
             pref_code = area_code[:2] + "0000"
-            weather_response = requests.get(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{pref_code}.json")
-            weather_response.raise_for_status()
-            weather_data = weather_response.json()
+            weather_data = fetch_forecast(pref_code)
 
             try:
                 forecasts = []
@@ -4,9 +4,14 @@ import flet as ft
 import requests
 import os
 
+from area_index import open_area_index
+from forecast_fetch import fetch_forecast
+
+DB_PATH = 'forecast_data.db'
+
 # データベースのセットアップ
 def setup_database():
-    conn = sqlite3.connect('forecast_data.db')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
 
     c.execute('''
@@ -52,7 +57,7 @@ def setup_database():
 # 天気予報データを挿入する
 def insert_weather_data(area_code, area_name, forecasts):
     try:
-        conn = sqlite3.connect('forecast_data.db')
+        conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
 
         print(f"Inserting area: {area_code}, {area_name}")
@@ -92,7 +97,7 @@ def insert_data_from_json(json_file_path):
 
     print("Inserting data into the database...")
     try:
-        conn = sqlite3.connect('forecast_data.db')
+        conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
 
         for region_code, region_data in centers.items():
@@ -118,44 +123,32 @@ def insert_data_from_json(json_file_path):
             conn.close()
             print("SQLite connection closed.")
 
-# データベースのセットアップ実行
-setup_database()
-
-# JSONファイルのパスを指定
-json_file_path = os.path.join(os.path.dirname(__file__), 'areas.json')
-
-# JSONファイルからデータを挿入
-insert_data_from_json(json_file_path)
-
 # 過去のデータや天気予報を表示するための関数
 def main(page: ft.Page):
     json_file_path = os.path.join(os.path.dirname(__file__), 'areas.json')
 
+    # 解析済みのエリアインデックスを mmap で開く (プロセス間でページを共有)
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        areas = open_area_index(json_file_path)
     except FileNotFoundError as e:
         print(f"JSONファイルが見つかりません: {e.filename}")
         return
-    except IOError as e:
-        print(f"JSONファイルの読み込みに失敗しました: {e.strerror}")
+    except (IOError, ValueError) as e:
+        print(f"エリアインデックスの読み込みに失敗しました: {e}")
         return
 
-    offices = json_data.get("offices", {})
-    centers = json_data.get("centers", {})
-
     def get_region_options():
-        return [ft.dropdown.Option(key, value.get("name", "Unknown")) for key, value in centers.items()]
+        return [ft.dropdown.Option(code, areas.name("centers", code, "Unknown")) for code in areas.codes("centers")]
 
     def on_region_select(e):
         selected_region_code = e.control.value
-        prefectures = centers.get(selected_region_code, {}).get("children", [])
+        prefectures = areas.children("centers", selected_region_code)
 
         if not prefectures:
             print(f"Error: No prefectures found for region code {selected_region_code}")
             return
 
-        prefecture_options = [ft.dropdown.Option(code, offices.get(code, {}).get("name", "Unnamed Area")) for code in prefectures]
+        prefecture_options = [ft.dropdown.Option(code, areas.name("offices", code, "Unnamed Area")) for code in prefectures]
 
         prefecture_dropdown.options = prefecture_options
         prefecture_dropdown.visible = True
@@ -167,7 +160,7 @@ def main(page: ft.Page):
 
     def on_prefecture_select(e):
         selected_prefecture_code = e.control.value
-        small_areas = offices.get(selected_prefecture_code, {}).get("children", [])
+        small_areas = areas.children("offices", selected_prefecture_code)
 
         if not small_areas:
             return
@@ -175,9 +168,7 @@ def main(page: ft.Page):
         pref_code = selected_prefecture_code
 
         try:
-            weather_response = requests.get(f"https://www.jma.go.jp/bosai/forecast/data/forecast/{pref_code}.json")
-            weather_response.raise_for_status()
-            weather_data = weather_response.json()
+            weather_data = fetch_forecast(pref_code)
         except requests.RequestException as re:
             print(f"天気情報の取得に失敗しました: {re}")
             return
@@ -197,7 +188,7 @@ def main(page: ft.Page):
         get_weather_dates(selected_area_code)
 
     def get_weather_dates(area_code):
-        conn = sqlite3.connect('forecast_data.db')
+        conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
 
         c.execute('''
@@ -218,7 +209,7 @@ def main(page: ft.Page):
         display_weather(selected_area_code, selected_date)
 
     def display_weather(area_code, selected_date):
-        conn = sqlite3.connect('forecast_data.db')
+        conn = sqlite3.connect(DB_PATH)
         c = conn.cursor()
 
         c.execute('''
@@ -283,12 +274,9 @@ def main(page: ft.Page):
         ])
     )
 
-# Fletアプリの実行
-ft.app(target=main)
-
 # データベースの内容確認用関数
 def check_database():
-    conn = sqlite3.connect('forecast_data.db')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
 
     print("Checking regions table:")
@@ -309,4 +297,19 @@ def check_database():
 
     conn.close()
 
-check_database()
\ No newline at end of file
+
+# 負荷試験 (loadtest.py) から main() を import できるよう、起動処理はスクリプト実行時のみ行う
+if __name__ == "__main__":
+    # データベースのセットアップ実行
+    setup_database()
+
+    # JSONファイルのパスを指定
+    json_file_path = os.path.join(os.path.dirname(__file__), 'areas.json')
+
+    # JSONファイルからデータを挿入
+    insert_data_from_json(json_file_path)
+
+    # Fletアプリの実行
+    ft.app(target=main)
+
+    check_database()
@@ -0,0 +1,102 @@
+import copy
+import threading
+from concurrent.futures import CancelledError
+
+import requests
+
+FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{office_code}.json"
+FETCH_TIMEOUT = 10
+
+
+# 同じキーに対する同時呼び出しを 1 回の実行にまとめる (single-flight)。
+# 実行はバックグラウンドのスレッドで行い、呼び出し側はそれぞれの
+# タイムアウトで結果を待つ。待機をやめても実行中の処理は他の待機者のために続く。
+class _Flight:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class FlightWaiter:
+    def __init__(self, flight):
+        self._flight = flight
+        self._cancelled = False
+
+    def cancel(self):
+        with self._flight.cond:
+            self._cancelled = True
+            self._flight.cond.notify_all()
+
+    def result(self, timeout=None):
+        flight = self._flight
+        with flight.cond:
+            finished = flight.cond.wait_for(lambda: flight.done or self._cancelled, timeout)
+            if self._cancelled:
+                raise CancelledError()
+            if not finished:
+                raise TimeoutError()
+            if flight.error is not None:
+                # 共有の例外を複数スレッドから raise するとトレースバックが混ざるため、待機者ごとに複製する。
+                # 複製できない例外は型を変えずにそのまま送出する
+                try:
+                    error = copy.copy(flight.error)
+                except Exception:
+                    raise flight.error
+                raise error from flight.error
+            return flight.result
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def start(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                threading.Thread(target=self._run, args=(key, flight, fn), daemon=True).start()
+        return FlightWaiter(flight)
+
+    def do(self, key, fn, timeout=None):
+        return self.start(key, fn).result(timeout)
+
+    def _run(self, key, flight, fn):
+        result, error = None, None
+        try:
+            result = fn()
+        except Exception as e:
+            error = e
+        except BaseException:
+            # KeyboardInterrupt などは待機者に渡さず、このスレッドで送出する
+            error = RuntimeError("取得処理が中断されました")
+            raise
+        finally:
+            # 完了後は次の呼び出しで新しく取得し直す (結果はキャッシュしない)
+            with self._lock:
+                del self._flights[key]
+            with flight.cond:
+                flight.result, flight.error, flight.done = result, error, True
+                flight.cond.notify_all()
+
+
+_forecast_flight = SingleFlight()
+
+
+def _download_forecast(office_code):
+    response = requests.get(FORECAST_URL.format(office_code=office_code), timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+# 気象台コードごとの予報 JSON を取得する。同じ気象台への同時リクエストは
+# 1 回のダウンロードと解析結果を共有する。呼び出し側は結果を書き換えないこと。
+def fetch_forecast(office_code, timeout=FETCH_TIMEOUT):
+    try:
+        return _forecast_flight.do(office_code, lambda: _download_forecast(office_code), timeout)
+    except TimeoutError:
+        raise requests.Timeout(f"予報データの取得待ちがタイムアウトしました: {office_code}")
@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import http.server
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import flet as ft
+
+import db2
+import forecast_fetch
+from area_index import open_area_index
+
+# db2.py の main() を画面なしで N セッション同時に動かす負荷試験。
+# 地方 → 都道府県 → 市区町村 → 日付 の順にハンドラを呼び出し、
+# ローカルの JMA スタブと一時 DB に対するレイテンシ・スループット・
+# メモリ・DB 処理時間 (ロック待ちを含む) をセッション数ごとに集計する。
+#
+#   python loadtest.py --sessions 1 10 50 100 200
+
+JSON_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'areas.json')
+HANDLERS = ["main", "region", "prefecture", "small_area", "date"]
+FORECAST_DATES = ["2024-01-01T17:00:00+09:00", "2024-01-02T00:00:00+09:00", "2024-01-03T00:00:00+09:00"]
+
+
+# JMA の forecast/{office}.json を真似たローカルサーバー
+def make_forecast(areas, office_code):
+    return [{
+        "publishingOffice": areas.name("offices", office_code, ""),
+        "timeSeries": [{
+            "timeDefines": FORECAST_DATES,
+            "areas": [{
+                "area": {"code": code, "name": areas.name("class10s", code, "")},
+                "weatherCodes": ["100", "200", "300"],
+                "weathers": ["晴れ", "くもり", "雨"],
+                "winds": ["北の風", "南の風", "西の風"],
+                "waves": ["１メートル", "１．５メートル", "２メートル"],
+            } for code in areas.children("offices", office_code)],
+        }],
+    }]
+
+
+def start_jma_stub(areas, latency):
+    hits = {"count": 0}
+    hits_lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            office_code = os.path.splitext(os.path.basename(self.path))[0]
+            if ("offices", office_code) not in areas:
+                self.send_error(404)
+                return
+            with hits_lock:
+                hits["count"] += 1
+            time.sleep(latency)
+            body = json.dumps(make_forecast(areas, office_code), ensure_ascii=False).encode("utf-8")
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # 待ちきれずに切断したクライアントは無視する
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, hits
+
+
+# DB の execute / commit にかかった時間と、ロック解除待ちが尽きた回数を数える。
+# タイムアウトは db2.py と同じ SQLite 既定 (5 秒) のビジーハンドラのままなので、
+# ロック待ちの時間は個別に取り出せず、execute / commit の所要時間に含まれる。
+class DbStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = []
+        self.locked = 0
+
+    def reset(self):
+        with self.lock:
+            self.durations, self.locked = [], 0
+
+    def timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                with self.lock:
+                    self.locked += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.durations.append(elapsed)
+
+
+def instrumented_sqlite(stats):
+    class Cursor(sqlite3.Cursor):
+        def execute(self, *args):
+            return stats.timed(super().execute, *args)
+
+    class Connection(sqlite3.Connection):
+        def cursor(self, factory=Cursor):
+            return super().cursor(factory)
+
+        def commit(self):
+            return stats.timed(super().commit)
+
+    def connect(database, **kwargs):
+        return sqlite3.connect(database, factory=Connection, **kwargs)
+
+    return SimpleNamespace(connect=connect, Error=sqlite3.Error, OperationalError=sqlite3.OperationalError)
+
+
+def prepare_database(areas):
+    db2.setup_database()
+    db2.insert_data_from_json(JSON_FILE_PATH)
+
+    # get_weather_dates / display_weather が返す行を用意しておく
+    rows = []
+    for office_code in areas.codes("offices"):
+        for code in areas.children("offices", office_code):
+            for date in FORECAST_DATES:
+                rows.append((code, date, "晴れ", "北の風", "１メートル"))
+    conn = sqlite3.connect(db2.DB_PATH)
+    conn.executemany('''
+        INSERT INTO weather (area_code, date, weather, wind, wave) VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+
+class HeadlessPage:
+    def __init__(self):
+        self.controls = []
+        self.updates = 0
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+
+    def update(self, *controls):
+        self.updates += 1
+
+
+def find_dropdowns(controls):
+    found = []
+    for control in controls:
+        if isinstance(control, ft.Dropdown):
+            found.append(control)
+        found.extend(find_dropdowns(getattr(control, "controls", None) or []))
+    return found
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in HANDLERS}
+        self.errors = 0
+        self.abandoned = 0
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def call(self, name, fn, *args):
+        started = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception:
+            self.add_error()
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[name].append(elapsed)
+
+
+def select(recorder, name, dropdown, rng):
+    if not dropdown.visible or not dropdown.options:
+        return False
+    dropdown.value = rng.choice(dropdown.options).key
+    recorder.call(name, dropdown.on_change, SimpleNamespace(control=dropdown, data=dropdown.value))
+    return True
+
+
+def run_session(recorder, iterations, seed):
+    rng = random.Random(seed)
+    page = HeadlessPage()
+    recorder.call("main", db2.main, page)
+    dropdowns = find_dropdowns(page.controls)
+    if len(dropdowns) != 4:
+        recorder.add_error()
+        return
+
+    # 地方 → 都道府県 → 市区町村 → 日付 (選択肢が出なければそこで打ち切り)。
+    # 取得失敗はハンドラ内で握りつぶされ次の選択肢が出ないだけなので、途中終了として数える
+    for _ in range(iterations):
+        for name, dropdown in zip(HANDLERS[1:], dropdowns):
+            if not select(recorder, name, dropdown, rng):
+                with recorder.lock:
+                    recorder.abandoned += 1
+                break
+
+
+# 他セッションの get_weather による書き込みを模した書き込みスレッド
+def run_writer(areas, stop, interval, seed):
+    rng = random.Random(seed)
+    area_codes = [code for office_code in areas.codes("offices")
+                  for code in areas.children("offices", office_code)]
+    forecasts = [{"date": "2024-01-04T00:00:00+09:00", "weather": "晴れ", "wind": "北の風", "wave": "１メートル"}]
+    while not stop.is_set():
+        code = rng.choice(area_codes)
+        try:
+            db2.insert_weather_data(code, areas.name("class10s", code, ""), forecasts)
+        except sqlite3.Error:
+            pass
+        stop.wait(interval)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest-rank 法
+    k = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return float("nan")
+
+
+def run_level(areas, sessions, args, db_stats, stub_hits):
+    recorder = Recorder()
+    db_stats.reset()
+    hits_before = stub_hits["count"]
+
+    stop = threading.Event()
+    writers = [threading.Thread(target=run_writer, args=(areas, stop, args.write_interval, args.seed + i), daemon=True)
+               for i in range(args.writers)]
+    for writer in writers:
+        writer.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, recorder, args.iterations, args.seed * 100003 + i)
+                   for i in range(sessions)]
+    elapsed = time.perf_counter() - started
+    for future in futures:
+        if future.exception() is not None:
+            recorder.add_error()
+
+    stop.set()
+    for writer in writers:
+        writer.join()
+
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    return {
+        "sessions": sessions,
+        "calls": len(all_latencies),
+        "errors": recorder.errors,
+        "abandoned": recorder.abandoned,
+        "elapsed": elapsed,
+        "throughput": len(all_latencies) / elapsed if elapsed else 0.0,
+        "latencies": recorder.latencies,
+        "all": all_latencies,
+        "db_calls": len(db_stats.durations),
+        "db_p99": percentile(db_stats.durations, 99),
+        "db_locked": db_stats.locked,
+        "stub_hits": stub_hits["count"] - hits_before,
+        "rss": rss_mb(),
+    }
+
+
+def print_report(results, per_handler):
+    header = (f"{'sessions':>8} {'calls':>7} {'err':>5} {'abandon':>7} {'calls/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'db ops':>7} {'db p99 ms':>9} {'locked':>6} {'fetches':>7} {'RSS MB':>8}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['sessions']:>8} {r['calls']:>7} {r['errors']:>5} {r['abandoned']:>7} {r['throughput']:>9.1f} "
+              f"{percentile(r['all'], 50) * 1000:>8.2f} {percentile(r['all'], 99) * 1000:>8.2f} "
+              f"{r['db_calls']:>7} {r['db_p99'] * 1000:>9.2f} {r['db_locked']:>6} "
+              f"{r['stub_hits']:>7} {r['rss']:>8.1f}")
+        if per_handler:
+            for name in HANDLERS:
+                values = r["latencies"][name]
+                print(f"{'':>8} {name:>12}: n={len(values):<6} "
+                      f"p50={percentile(values, 50) * 1000:.2f}ms p99={percentile(values, 99) * 1000:.2f}ms")
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"1 以上を指定してください: {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="db2.py のハンドラを画面なしで同時実行する負荷試験",
+        epilog="db p99 ms は execute/commit の所要時間で、SQLite 既定 (5 秒) のビジーハンドラによる"
+               "ロック待ちを含む。locked はその待ちが尽きて失敗した回数。"
+               "abandon は取得失敗などで次の選択肢が出ず途中で終わったフロー数。")
+    parser.add_argument("--sessions", type=positive_int, nargs="+", default=[1, 10, 50, 100, 200],
+                        help="同時セッション数 (複数指定で順に実行)")
+    parser.add_argument("--iterations", type=int, default=5, help="1 セッションあたりの選択フロー回数")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="JMA スタブの応答遅延 (秒)")
+    parser.add_argument("--writers", type=int, default=1, help="並行して天気データを書き込むスレッド数")
+    parser.add_argument("--write-interval", type=float, default=0.01, help="書き込みスレッドの間隔 (秒)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--per-handler", action="store_true", help="ハンドラごとの p50/p99 も表示する")
+    args = parser.parse_args()
+
+    areas = open_area_index(JSON_FILE_PATH)
+    server, stub_hits = start_jma_stub(areas, args.stub_latency)
+    tmp_dir = tempfile.mkdtemp(prefix="weather-loadtest-")
+    db_stats = DbStats()
+
+    db2.DB_PATH = os.path.join(tmp_dir, "forecast_data.db")
+    db2.sqlite3 = instrumented_sqlite(db_stats)
+    forecast_fetch.FORECAST_URL = f"http://127.0.0.1:{server.server_port}/forecast/{{office_code}}.json"
+
+    results = []
+    try:
+        # db2.py のデバッグ出力で結果が埋もれないよう、実行中の標準出力は捨てる
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            prepare_database(areas)
+            for sessions in args.sessions:
+                results.append(run_level(areas, sessions, args, db_stats, stub_hits))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print_report(results, args.per_handler)
+
+
+if __name__ == "__main__":
+    main()